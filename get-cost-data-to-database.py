@@ -1,18 +1,41 @@
+import argparse
+import atexit
 import boto3
+import calendar
+import gzip
+import hashlib
+import json
+import os
 import psycopg2
-import time
+import psycopg2.pool
+from psycopg2.extras import execute_values
 import logging
+import logging.handlers
+import queue
+import tempfile
+import threading
+import weakref
+from botocore.config import Config
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from concurrent.futures import ThreadPoolExecutor
 
-# Setup logging
+# Setup logging: worker threads only enqueue records, a listener thread does the writing
+log_formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")  # Timestamp and severity level
+console_handler = logging.StreamHandler()  # Output to console
+file_handler = logging.FileHandler("aws_costs_script.log")  # Log to file
+console_handler.setFormatter(log_formatter)
+file_handler.setFormatter(log_formatter)
+
+log_queue = queue.Queue(-1)
+log_listener = logging.handlers.QueueListener(log_queue, console_handler, file_handler)
+log_listener.start()
+atexit.register(log_listener.stop)  # Flush pending records on exit
+
 logging.basicConfig(
     level=logging.INFO,  # Log all levels from INFO and above
-    format="%(asctime)s - %(levelname)s - %(message)s",  # Timestamp and severity level
-    handlers=[
-        logging.StreamHandler(),  # Output to console
-        logging.FileHandler("aws_costs_script.log")  # Log to file
-    ]
+    format="%(message)s",  # Full formatting happens in the listener's handlers
+    handlers=[logging.handlers.QueueHandler(log_queue)]
 )
 logger = logging.getLogger()
 
@@ -22,225 +45,443 @@ db_name = 'db_name'
 db_user = 'db_user'
 db_password = 'db_password'
 
-# Connect to the PostgreSQL database
-def connect_db():
+# List of AWS CLI profile names (replace with your actual names)
+aws_accounts = ["account-1"]
+
+# Linked account ids mapped to the profile names above, so --consolidated stores each account
+# under the same name as per-profile mode (replace with your actual ids and names)
+linked_account_names = {
+    "123456789012": "account-1",
+}
+
+# Number of accounts processed concurrently (Cost Explorer calls are IO-bound)
+max_workers = max(1, min(len(aws_accounts), 16))  # At least one, so an empty list is a no-op
+
+# Create a thread-safe pool of PostgreSQL connections, one per worker thread
+def create_pool():
     try:
-        conn = psycopg2.connect(
+        db_pool = psycopg2.pool.ThreadedConnectionPool(
+            minconn=min(4, max_workers),
+            maxconn=max_workers + 4,
             host=db_host,
             dbname=db_name,
             user=db_user,
             password=db_password
         )
-        logger.info("Database connection established successfully.")
-        return conn
+        logger.info("Database connection pool established successfully.")
+        return db_pool
     except Exception as e:
         logger.error(f"Error connecting to database: {e}")
         raise
 
-conn = connect_db()
-cursor = conn.cursor()
+db_pool = create_pool()
+
+# Per-thread storage for boto3 sessions and pending ids (neither is safe to share)
+thread_local = threading.local()
+
+# Borrow a connection from the pool and always give it back
+@contextmanager
+def get_conn():
+    conn = db_pool.getconn()
+    try:
+        yield conn
+    finally:
+        db_pool.putconn(conn)
 
 # Create the necessary tables if they don't exist
-cursor.execute("""
-    CREATE TABLE IF NOT EXISTS accounts (
-        account_id SERIAL PRIMARY KEY,
-        account_name VARCHAR(255) UNIQUE NOT NULL
-    );
-
-    CREATE TABLE IF NOT EXISTS months (
-        month_id SERIAL PRIMARY KEY,
-        month_name VARCHAR(20) UNIQUE NOT NULL
-    );
-
-    CREATE TABLE IF NOT EXISTS years (
-        year_id SERIAL PRIMARY KEY,
-        year_name VARCHAR(4) UNIQUE NOT NULL
-    );
-
-    CREATE TABLE IF NOT EXISTS services (
-        service_id SERIAL PRIMARY KEY,
-        service_name VARCHAR(255) UNIQUE NOT NULL
-    );
-
-    CREATE TABLE IF NOT EXISTS aws_costs (
-        cost_id SERIAL PRIMARY KEY,
-        account_id INT REFERENCES accounts(account_id),
-        service_id INT REFERENCES services(service_id),
-        month_id INT REFERENCES months(month_id),
-        year_id INT REFERENCES years(year_id),
-        cost DECIMAL(18, 2) NOT NULL,
-        UNIQUE(account_id, service_id, month_id, year_id)
-    );
-""")
-conn.commit()
+with get_conn() as conn, conn.cursor() as cursor:
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS accounts (
+            account_id SERIAL PRIMARY KEY,
+            account_name VARCHAR(255) UNIQUE NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS months (
+            month_id SERIAL PRIMARY KEY,
+            month_name VARCHAR(20) UNIQUE NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS years (
+            year_id SERIAL PRIMARY KEY,
+            year_name VARCHAR(4) UNIQUE NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS services (
+            service_id SERIAL PRIMARY KEY,
+            service_name VARCHAR(255) UNIQUE NOT NULL
+        );
+
+        -- Equality-only lookups by name (hash indexes are WAL-logged since PostgreSQL 10)
+        CREATE INDEX IF NOT EXISTS services_name_hash ON services USING hash (service_name);
+
+        CREATE TABLE IF NOT EXISTS aws_costs (
+            cost_id SERIAL PRIMARY KEY,
+            account_id INT REFERENCES accounts(account_id),
+            service_id INT REFERENCES services(service_id),
+            month_id INT REFERENCES months(month_id),
+            year_id INT REFERENCES years(year_id),
+            cost DOUBLE PRECISION NOT NULL,
+            UNIQUE(account_id, service_id, month_id, year_id)
+        );
+
+        -- Migrate databases created before cost was stored as double precision
+        DO $$
+        BEGIN
+            IF EXISTS (
+                SELECT 1 FROM information_schema.columns
+                WHERE table_schema = current_schema()
+                    AND table_name = 'aws_costs'
+                    AND column_name = 'cost'
+                    AND data_type <> 'double precision'
+            ) THEN
+                ALTER TABLE aws_costs ALTER COLUMN cost TYPE DOUBLE PRECISION;
+            END IF;
+        END $$;
+    """)
+    conn.commit()
 logger.info("Database schema created or verified.")
 
-# Batch insert function for accounts, months, years, and services
-def batch_insert(table, column, values):
+# In-process cache of dimension ids, keyed by (table, name)
+id_cache = {}
+
+# Run a block in a single transaction, sharing newly resolved ids only once committed
+@contextmanager
+def transaction(conn):
+    thread_local.pending_ids = {}
     try:
-        cursor.executemany(f"""
-            INSERT INTO {table} ({column})
-            VALUES (%s)
-            ON CONFLICT ({column}) DO NOTHING
-        """, [(value,) for value in values])
-        conn.commit()
-        logger.info(f"Inserted {len(values)} records into {table}.")
-    except Exception as e:
-        logger.error(f"Error inserting into {table}: {e}")
-        conn.rollback()
+        with conn:
+            yield conn
+        id_cache.update(thread_local.pending_ids)
+    finally:
+        thread_local.pending_ids = {}
+
+# Get the id of a dimension row, inserting it if missing, in a single round trip
+def get_or_insert(conn, table, id_column, name_column, value):
+    key = (table, value)
+    if key in id_cache:
+        return id_cache[key]
+    pending_ids = thread_local.pending_ids
+    if key in pending_ids:
+        return pending_ids[key]
+
+    with conn.cursor() as cursor:
+        cursor.execute(f"""
+            WITH ins AS (
+                INSERT INTO {table} ({name_column}) VALUES (%s)
+                ON CONFLICT ({name_column}) DO NOTHING
+                RETURNING {id_column}
+            )
+            SELECT {id_column} FROM ins
+            UNION ALL
+            SELECT {id_column} FROM {table} WHERE {name_column} = %s
+            LIMIT 1
+        """, (value, value))
+        result = cursor.fetchone()
+        if result is None:
+            # A concurrent transaction committed the row after this statement started
+            cursor.execute(f"""
+                SELECT {id_column} FROM {table} WHERE {name_column} = %s
+            """, (value,))
+            result = cursor.fetchone()
+    pending_ids[key] = result[0]
+    return result[0]
 
 # Get or insert month
-def get_or_insert_month(month_name):
-    cursor.execute("""
-        SELECT month_id FROM months WHERE month_name = %s
-    """, (month_name,))
-    result = cursor.fetchone()
-    if result:
-        return result[0]
-    else:
-        cursor.execute("""
-            INSERT INTO months (month_name) VALUES (%s) RETURNING month_id
-        """, (month_name,))
-        conn.commit()
-        return cursor.fetchone()[0]
+def get_or_insert_month(conn, month_name):
+    return get_or_insert(conn, 'months', 'month_id', 'month_name', month_name)
 
 # Get or insert year
-def get_or_insert_year(year_name):
-    cursor.execute("""
-        SELECT year_id FROM years WHERE year_name = %s
-    """, (year_name,))
-    result = cursor.fetchone()
-    if result:
-        return result[0]
-    else:
-        cursor.execute("""
-            INSERT INTO years (year_name) VALUES (%s) RETURNING year_id
-        """, (year_name,))
-        conn.commit()
-        return cursor.fetchone()[0]
-
-# Get or insert service
-def get_or_insert_service(service_name):
-    cursor.execute("""
-        SELECT service_id FROM services WHERE service_name = %s
-    """, (service_name,))
-    result = cursor.fetchone()
-    if result:
-        return result[0]
-    else:
-        cursor.execute("""
-            INSERT INTO services (service_name) VALUES (%s) RETURNING service_id
-        """, (service_name,))
-        conn.commit()
-        return cursor.fetchone()[0]
+def get_or_insert_year(conn, year_name):
+    return get_or_insert(conn, 'years', 'year_id', 'year_name', year_name)
+
+# Insert services in bulk and return a {service_name: service_id} map in one round trip
+def get_service_ids(conn, service_names):
+    with conn.cursor() as cursor:
+        rows = execute_values(cursor, """
+            WITH input (service_name) AS (VALUES %s),
+            ins AS (
+                INSERT INTO services (service_name)
+                SELECT service_name FROM input
+                ON CONFLICT (service_name) DO NOTHING
+                RETURNING service_id, service_name
+            )
+            SELECT service_id, service_name FROM ins
+            UNION ALL
+            SELECT service_id, service_name FROM services JOIN input USING (service_name)
+        """, [(service_name,) for service_name in service_names], page_size=1000, fetch=True)
+        service_ids = {service_name: service_id for service_id, service_name in rows}
+
+        # Services committed by a concurrent transaction after the statement started
+        missing = [service_name for service_name in service_names if service_name not in service_ids]
+        if missing:
+            cursor.execute("""
+                SELECT service_id, service_name FROM services WHERE service_name = ANY(%s)
+            """, (missing,))
+            service_ids.update({service_name: service_id for service_id, service_name in cursor.fetchall()})
+
+    logger.info(f"Resolved {len(service_ids)} services.")
+    return service_ids
 
 # Get or insert account
-def get_or_insert_account(account_name):
-    cursor.execute("""
-        SELECT account_id FROM accounts WHERE account_name = %s
-    """, (account_name,))
-    result = cursor.fetchone()
-    if result:
-        return result[0]
-    else:
+def get_or_insert_account(conn, account_name):
+    return get_or_insert(conn, 'accounts', 'account_id', 'account_name', account_name)
+
+# Cost Explorer client settings: connection pool sized to the workers, adaptive retries with backoff
+ce_config = Config(
+    max_pool_connections=max_workers,
+    retries={"max_attempts": 5, "mode": "adaptive"},
+    connect_timeout=5,
+    read_timeout=30
+)
+
+# Get the boto3 session for a profile, reusing one per thread
+def get_session(profile_name):
+    if not hasattr(thread_local, "sessions"):
+        thread_local.sessions = {}
+    if profile_name not in thread_local.sessions:
+        thread_local.sessions[profile_name] = boto3.session.Session(profile_name=profile_name)
+    return thread_local.sessions[profile_name]
+
+# Local cache of Cost Explorer responses for closed periods
+cache_dir = os.path.expanduser("~/.cache/aws-costs")
+
+# Path of the cached response for an account and request
+def cache_path(account, request):
+    key = json.dumps([account, request], sort_keys=True)
+    return os.path.join(cache_dir, hashlib.sha256(key.encode()).hexdigest() + ".json.gz")
+
+# A period is closed once it ends on or before the current month (its costs may still be estimated)
+def is_closed_period(end):
+    return end <= datetime.today().replace(day=1).strftime("%Y-%m-%d")
+
+# Load a cached response, treating an unreadable file as a cache miss
+def load_cached_response(path):
+    if not os.path.exists(path):
+        return None
+    try:
+        with gzip.open(path, "rt") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.warning(f"Discarding unreadable Cost Explorer cache file '{path}': {e}")
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+
+# Save a response to the cache, replacing the file atomically so a failed write never leaves a partial one
+def save_cached_response(path, response):
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt") as f:
+                json.dump(response, f, default=str)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+    except Exception as e:
+        logger.warning(f"Could not write Cost Explorer cache file '{path}': {e}")
+
+# Fetch every page of a Cost Explorer request, merging groups that belong to the same period
+def get_cost_and_usage_pages(client, request):
+    request = dict(request)
+    results_by_time = {}
+    while True:
+        page = client.get_cost_and_usage(**request)
+        for result in page["ResultsByTime"]:
+            period = results_by_time.setdefault(
+                result["TimePeriod"]["Start"], {"TimePeriod": result["TimePeriod"], "Estimated": False, "Groups": []}
+            )
+            period["Estimated"] = period["Estimated"] or result.get("Estimated", False)
+            period["Groups"].extend(result["Groups"])
+        if not page.get("NextPageToken"):
+            break
+        request["NextPageToken"] = page["NextPageToken"]
+    return {"ResultsByTime": list(results_by_time.values())}
+
+# Fetch cost data from Cost Explorer
+def fetch_costs(client, account, group_by):
+    request = {
+        "TimePeriod": {"Start": start_date, "End": end_date},
+        "Granularity": "MONTHLY",
+        "Metrics": ["UnblendedCost"],
+        "GroupBy": group_by
+    }
+
+    # Final costs of closed periods never change, so reuse a previously cached response
+    closed = is_closed_period(end_date)
+    path = cache_path(account, request)
+    if closed:
+        response = load_cached_response(path)
+        if response is not None:
+            logger.info(f"AWS API response loaded from cache for account '{account}'.")
+            return response
+
+    # Retries and backoff are handled by botocore (see ce_config)
+    try:
+        response = get_cost_and_usage_pages(client, request)
+        logger.info(f"AWS API response fetched for account '{account}'.")
+    except Exception as e:
+        logger.error(f"AWS API call failed for account '{account}': {e}")
+        return None
+
+    # Cost Explorer keeps a just-closed month estimated for some days; only cache final costs
+    estimated = any(result.get("Estimated", False) for result in response["ResultsByTime"])
+    if closed and not estimated:
+        save_cached_response(path, response)
+    return response
+
+# Pooled connections on which the aws_costs insert is already prepared (weak, so discarded connections drop out)
+prepared_conns = weakref.WeakSet()
+
+# Prepare the aws_costs insert once per connection so Postgres parses and plans it only once.
+# It takes one array per column, so a single EXECUTE inserts every row for the account.
+def prepare_cost_insert(conn):
+    if conn in prepared_conns:
+        return
+    with conn.cursor() as cursor:
         cursor.execute("""
-            INSERT INTO accounts (account_name) VALUES (%s) RETURNING account_id
-        """, (account_name,))
-        conn.commit()
-        return cursor.fetchone()[0]
+            PREPARE insert_cost (INT[], INT[], INT[], INT[], FLOAT8[]) AS
+            INSERT INTO aws_costs (account_id, service_id, month_id, year_id, cost)
+            SELECT * FROM unnest($1, $2, $3, $4, $5)
+            ON CONFLICT (account_id, service_id, month_id, year_id) DO NOTHING
+        """)
+    conn.commit()
+    prepared_conns.add(conn)
+
+# Store a Cost Explorer response grouped by service for a single account
+def store_costs(account, response):
+    # Borrow a dedicated connection for this worker
+    with get_conn() as conn:
+        prepare_cost_insert(conn)
+
+        # Commit everything for the account at once
+        with transaction(conn):
+            # Get month and year details
+            period_start = response["ResultsByTime"][0]["TimePeriod"]["Start"]
+            month_label = calendar.month_abbr[int(period_start[5:7])]  # Dates are always YYYY-MM-DD
+            year_label = period_start[:4]
+
+            month_id = get_or_insert_month(conn, month_label)
+            year_id = get_or_insert_year(conn, year_label)
+
+            # Collect service names and costs in a single pass over the response
+            service_names = set()  # To avoid duplicates
+            records = []
+            for result in response["ResultsByTime"]:
+                for group in result["Groups"]:
+                    service_name = group["Keys"][0]
+                    service_names.add(service_name)
+                    records.append((service_name, float(group["Metrics"]["UnblendedCost"]["Amount"])))
+
+            # Insert services in bulk and fetch all their ids at once
+            service_ids = get_service_ids(conn, sorted(service_names))  # Sorted for a consistent lock order
+
+            # The account id never varies per group, so look it up once
+            account_id = get_or_insert_account(conn, account)
+
+            # Insert costs in bulk
+            cost_data = [
+                (account_id, service_ids[service_name], month_id, year_id, cost)
+                for service_name, cost in records
+            ]
+
+            # Send all rows as one prepared statement, passing each column as an array
+            if cost_data:
+                columns = [list(column) for column in zip(*cost_data)]
+                with conn.cursor() as cursor:
+                    cursor.execute("EXECUTE insert_cost (%s, %s, %s, %s, %s)", columns)
+
+    logger.info(f"Cost data for account '{account}' stored successfully.")
 
 # Fetch cost data and insert it
 def process_account(account):
     try:
         logger.info(f"Processing account '{account}'.")
 
-        # Set the AWS profile for the current account
-        boto3.setup_default_session(profile_name=account)
+        # Use a dedicated session for the current account instead of the global default
+        session = get_session(account)
 
         # Initialize AWS Cost Explorer client for the current profile
-        client = boto3.client('ce')
-
-        # Retry logic for AWS API
-        retries = 3
-        for attempt in range(retries):
-            try:
-                response = client.get_cost_and_usage(
-                    TimePeriod={"Start": start_date, "End": end_date},
-                    Granularity="MONTHLY",
-                    Metrics=["UnblendedCost"],
-                    GroupBy=[{"Type": "DIMENSION", "Key": "SERVICE"}]
-                )
-                logger.info(f"AWS API response fetched for account '{account}'.")
-                break  # If successful, exit the retry loop
-            except Exception as e:
-                if attempt < retries - 1:
-                    logger.warning(f"AWS API call failed (attempt {attempt + 1}/{retries}): {e}. Retrying...")
-                    time.sleep(2 ** attempt)  # Exponential backoff
-                else:
-                    logger.error(f"AWS API call failed after {retries} attempts for account '{account}': {e}")
-                    return
-
-        # Get month and year details
-        period_start = response["ResultsByTime"][0]["TimePeriod"]["Start"]
-        month_label = datetime.strptime(period_start, "%Y-%m-%d").strftime("%b")
-        year_label = datetime.strptime(period_start, "%Y-%m-%d").strftime("%Y")
-
-        # Insert months and years in bulk
-        batch_insert('months', 'month_name', [month_label])
-        batch_insert('years', 'year_name', [year_label])
-
-        month_id = get_or_insert_month(month_label)
-        year_id = get_or_insert_year(year_label)
-
-        service_names = set()  # To avoid duplicates
-        for result in response["ResultsByTime"]:
-            for group in result["Groups"]:
-                service_name = group["Keys"][0]
-                service_names.add(service_name)
+        client = session.client('ce', config=ce_config)
 
-        # Insert services in bulk
-        batch_insert('services', 'service_name', list(service_names))
+        response = fetch_costs(client, account, [{"Type": "DIMENSION", "Key": "SERVICE"}])
+        if response is None:
+            return
 
-        # Insert costs in bulk
-        cost_data = []
-        for result in response["ResultsByTime"]:
-            for group in result["Groups"]:
-                service_name = group["Keys"][0]
-                cost = float(group["Metrics"]["UnblendedCost"]["Amount"])
-                service_id = get_or_insert_service(service_name)
-                account_id = get_or_insert_account(account)
+        store_costs(account, response)
 
-                cost_data.append((account_id, service_id, month_id, year_id, cost))
+    except Exception as e:
+        logger.error(f"Error processing account '{account}': {e}")
 
-        cursor.executemany("""
-            INSERT INTO aws_costs (account_id, service_id, month_id, year_id, cost)
-            VALUES (%s, %s, %s, %s, %s)
-            ON CONFLICT (account_id, service_id, month_id, year_id) DO NOTHING
-        """, cost_data)
-        conn.commit()
+# Fetch cost data for every linked account with a single call from the payer account
+def process_consolidated(payer_profile):
+    try:
+        logger.info(f"Processing linked accounts through payer profile '{payer_profile}'.")
+
+        session = get_session(payer_profile)
+        client = session.client('ce', config=ce_config)
+
+        response = fetch_costs(client, payer_profile, [
+            {"Type": "DIMENSION", "Key": "LINKED_ACCOUNT"},
+            {"Type": "DIMENSION", "Key": "SERVICE"}
+        ])
+        if response is None:
+            return
+
+        # Split the response into one service-grouped response per linked account
+        account_responses = {}
+        for index, result in enumerate(response["ResultsByTime"]):
+            for group in result["Groups"]:
+                linked_account, service_name = group["Keys"]
+                if linked_account not in account_responses:
+                    account_responses[linked_account] = {"ResultsByTime": [
+                        {"TimePeriod": r["TimePeriod"], "Groups": []} for r in response["ResultsByTime"]
+                    ]}
+                account_responses[linked_account]["ResultsByTime"][index]["Groups"].append(
+                    {"Keys": [service_name], "Metrics": group["Metrics"]}
+                )
 
-        logger.info(f"Cost data for account '{account}' stored successfully.")
+        # Store each linked account under its profile name. Unmapped accounts fall back to their id,
+        # which per-profile mode never uses: mixing both modes against one database would then
+        # create two accounts rows for the same account and double-count its costs.
+        for linked_account, account_response in account_responses.items():
+            account_name = linked_account_names.get(linked_account)
+            if account_name is None:
+                logger.warning(f"Linked account '{linked_account}' has no profile name mapping; storing it under its id.")
+                account_name = linked_account
+            store_costs(account_name, account_response)
 
     except Exception as e:
-        logger.error(f"Error processing account '{account}': {e}")
+        logger.error(f"Error processing payer profile '{payer_profile}': {e}")
 
 # Main logic
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Store AWS Cost Explorer data in PostgreSQL.")
+    parser.add_argument(
+        "--consolidated",
+        metavar="PAYER_PROFILE",
+        help="fetch all linked accounts with one Cost Explorer call using the payer account profile"
+    )
+    args = parser.parse_args()
+
     current_date = datetime.today()
     first_day_of_current_month = current_date.replace(day=1)
     first_day_of_previous_month = (first_day_of_current_month - timedelta(days=1)).replace(day=1)
     start_date = first_day_of_previous_month.strftime("%Y-%m-%d")
     end_date = first_day_of_current_month.strftime("%Y-%m-%d")
 
-    # List of AWS CLI profile names (replace with your actual names)
-    aws_accounts = ["account-1"]
-
-    logger.info(f"Starting the script for {len(aws_accounts)} accounts.")
-    with ThreadPoolExecutor() as executor:
-        executor.map(process_account, aws_accounts)
+    if args.consolidated:
+        logger.info("Starting the script in consolidated mode.")
+        process_consolidated(args.consolidated)
+    else:
+        logger.info(f"Starting the script for {len(aws_accounts)} accounts.")
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(process_account, aws_accounts))  # Consume results so failures surface
 
-    # Close the cursor and connection
-    cursor.close()
-    conn.close()
+    # Close all pooled connections
+    db_pool.closeall()
 
     logger.info("Script execution completed.")
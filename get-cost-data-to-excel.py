@@ -1,6 +1,7 @@
 import boto3
 import calendar
 import pandas as pd
+import xlsxwriter
 from datetime import datetime, timedelta
 
 # Get the current date
@@ -29,38 +30,48 @@ for account in aws_accounts:
     # Initialize AWS Cost Explorer client for the current profile
     client = boto3.client('ce')
 
-    # Fetch cost data grouped by service and month
-    response = client.get_cost_and_usage(
-        TimePeriod={"Start": start_date, "End": end_date},
-        Granularity="MONTHLY",
-        Metrics=["UnblendedCost"],
-        GroupBy=[{"Type": "DIMENSION", "Key": "SERVICE"}]
+    # Fetch cost data grouped by service and month, following NextPageToken across pages
+    request = {
+        "TimePeriod": {"Start": start_date, "End": end_date},
+        "Granularity": "MONTHLY",
+        "Metrics": ["UnblendedCost"],
+        "GroupBy": [{"Type": "DIMENSION", "Key": "SERVICE"}]
+    }
+    results_by_time = {}
+    while True:
+        page = client.get_cost_and_usage(**request)
+        for result in page["ResultsByTime"]:
+            # A period's groups can be split over several pages
+            period = results_by_time.setdefault(
+                result["TimePeriod"]["Start"], {"TimePeriod": result["TimePeriod"], "Groups": []}
+            )
+            period["Groups"].extend(result["Groups"])
+        if not page.get("NextPageToken"):
+            break
+        request["NextPageToken"] = page["NextPageToken"]
+    response = {"ResultsByTime": list(results_by_time.values())}
+
+    # Flatten the response into one record per service and month
+    # Dates are always YYYY-MM-DD, so slice them instead of parsing
+    months = [
+        f"{calendar.month_abbr[int(start[5:7])]} '{start[2:4]}"  # Format: Dec '24
+        for start in (result["TimePeriod"]["Start"] for result in response["ResultsByTime"])
+    ]
+    records = [
+        {"month": month_label, "service": group["Keys"][0], "cost": float(group["Metrics"]["UnblendedCost"]["Amount"])}
+        for month_label, result in zip(months, response["ResultsByTime"])
+        for group in result["Groups"]
+    ]
+
+    # Pivot to services as rows and months as columns
+    df = pd.DataFrame.from_records(records, columns=["month", "service", "cost"]).pivot_table(
+        index="service", columns="month", values="cost", aggfunc="sum", fill_value=0
     )
+    df = df.reindex(columns=months, fill_value=0)  # Keep months in chronological order
 
-    # Process response into a structured format
-    cost_data = {}
-    months = []
-
-    for result in response["ResultsByTime"]:
-        period_start = result["TimePeriod"]["Start"]
-        month_label = datetime.strptime(period_start, "%Y-%m-%d").strftime("%b '%y")  # Format: Dec '24
-        months.append(month_label)
-
-        for group in result["Groups"]:
-            service = group["Keys"][0]
-            cost = float(group["Metrics"]["UnblendedCost"]["Amount"])
-            if service not in cost_data:
-                cost_data[service] = {}
-            cost_data[service][month_label] = cost
-
-    # Convert to DataFrame
-    df = pd.DataFrame(cost_data).T.fillna(0)  # Transpose to make services rows
-    df = df.reindex(columns=months).reset_index()
-    df.rename(columns={"index": "Service"}, inplace=True)
-
-    # Add a Total column and sort by it
-    df["Total"] = df[months].sum(axis=1)
-    df = df.sort_values(by="Total", ascending=False).drop(columns=["Total"])  # Drop 'Total' after sorting
+    # Sort by total cost, highest first
+    df = df.loc[df.sum(axis=1).sort_values(ascending=False).index]
+    df = df.rename_axis(index="Service", columns=None).reset_index()
 
     # Store the result for the current account in the all_account_data dictionary
     all_account_data[account] = df
@@ -68,9 +79,12 @@ for account in aws_accounts:
     # Output
     print(f"Cost data for account '{account}' fetched successfully.")
 
-# Write to Excel
-with pd.ExcelWriter("aws_cost_data.xlsx", engine='openpyxl') as writer:
+# Write to Excel, streaming one row at a time (constant_memory requires row-by-row writes)
+with xlsxwriter.Workbook("aws_cost_data.xlsx", {"constant_memory": True}) as workbook:
     for account, df in all_account_data.items():
-        df.to_excel(writer, sheet_name=account, index=False)
+        worksheet = workbook.add_worksheet(account)
+        worksheet.write_row(0, 0, df.columns)
+        for row_number, row in enumerate(df.itertuples(index=False), start=1):
+            worksheet.write_row(row_number, 0, row)
 
 print("Excel file updated successfully, sorted by highest cost.")